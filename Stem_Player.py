@@ -1,52 +1,274 @@
-import sys, os, numpy as np, sounddevice as sd, soundfile as sf
+import sys, os, shutil, subprocess, tempfile, threading, importlib.util, numpy as np, sounddevice as sd, soundfile as sf, soxr
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from PySide6.QtWidgets import (
     QApplication, QWidget, QPushButton, QFileDialog,
     QVBoxLayout, QSlider, QGroupBox, QLabel, QHBoxLayout,
     QScrollArea, QTabWidget, QTextEdit
 )
-from PySide6.QtCore import Qt, QTimer
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-from faster_whisper import WhisperModel
+from PySide6.QtCore import Qt, QTimer, QObject, QThread, Signal, Slot, QPointF, QRect
+from PySide6.QtGui import QColor, QPainter, QPen, QPixmap, QPolygonF
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 PLAY_ICON = "▶ Play"
 PAUSE_ICON = "⏸ Pause"
 
 TRACK_KEYWORDS = ["instrumental", "drums", "vocals", "bass", "others"]
 
+SAMPLE_RATE = 44100  # every stem is resampled to this on load
+LOAD_BLOCK = 1 << 16
+BLOCKSIZE = 256
+RING_BLOCKS = 8      # ring buffer capacity, in blocks
+AHEAD_BLOCKS = 4     # how far the mixer thread runs ahead of playback
+EXPORT_BLOCK = 1 << 16
+
+# Stems are kept as int16; this folds dequantization into the track gains
+INT16_SCALE = 1 / 32768
+
+MODEL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "stemplayer")
+KERNEL_CACHE_DIR = os.path.join(MODEL_CACHE_DIR, "kernels")
+
+
+# ================= MIX KERNEL ================= #
+if njit is not None:
+    @njit(fastmath=True, cache=True, boundscheck=False, nogil=True)
+    def mix_block(stems, gains, pos, frames, out):
+        out[:] = 0
+        for k in range(stems.shape[0]):
+            g = gains[k]
+            if g == 0:
+                continue
+            for i in range(frames):
+                out[i] += g * stems[k, pos + i]
+else:
+    def mix_block(stems, gains, pos, frames, out):
+        np.dot(gains, stems[:, pos:pos + frames].astype(np.float32), out=out)
+
+
+_mix_kernels = {}
+
+
+# The stem count is fixed per load, so generate a kernel with the stem loop
+# unrolled into one multiply-add chain per sample, cached per count. Unlike
+# mix_block there is no zero-gain skip: muted stems are still read.
+def get_mix_kernel(n_stems):
+    if njit is None or n_stems == 0:
+        return mix_block
+
+    kernel = _mix_kernels.get(n_stems)
+    if kernel is None:
+        lines = ["def mix(stems, gains, pos, frames, out):"]
+        for k in range(n_stems):
+            lines.append(f"    s{k} = stems[{k}]")
+            lines.append(f"    g{k} = gains[{k}]")
+        lines.append("    for i in range(frames):")
+        lines.append("        j = pos + i")
+        lines.append("        out[i] = " + " + ".join(f"g{k} * s{k}[j]" for k in range(n_stems)))
+        body = "\n".join(lines) + "\n"
+
+        kernel = _load_cached_kernel(n_stems, body)
+        if kernel is None:
+            namespace = {}
+            exec(body, namespace)
+            kernel = njit(fastmath=True, boundscheck=False, nogil=True)(namespace["mix"])
+        _mix_kernels[n_stems] = kernel
+    return kernel
+
+
+# numba can only cache functions that live in a source file, so the generated
+# kernel is written out as a module and imported; None if that fails, so the
+# caller falls back to compiling in-process
+def _load_cached_kernel(n_stems, body):
+    source = (
+        "from numba import njit\n\n\n"
+        "@njit(fastmath=True, cache=True, boundscheck=False, nogil=True)\n" + body
+    )
+    path = os.path.join(KERNEL_CACHE_DIR, f"mix_{n_stems}.py")
+
+    try:
+        os.makedirs(KERNEL_CACHE_DIR, exist_ok=True)
+        existing = None
+        if os.path.isfile(path):
+            with open(path) as f:
+                existing = f.read()
+        # Rewriting identical source would bump its mtime and invalidate the cache.
+        # Write to a temp file and swap it in, so another running instance never
+        # imports a half-written module
+        if existing != source:
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=KERNEL_CACHE_DIR)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(source)
+                os.replace(tmp_path, path)
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+    except OSError:
+        return None
+
+    name = f"stemplayer_mix_{n_stems}"
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        # numba re-imports the module by name when it loads a cached overload
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+        return module.mix
+    except Exception:
+        sys.modules.pop(name, None)
+        return None
+
 
 # ================= LYRICS GENERATOR ================= #
+# Convert the Whisper model to a quantized CTranslate2 dir once and reuse it;
+# falls back to the plain model name (downloaded by faster-whisper) when the
+# converter isn't installed or the conversion fails
+def ensure_local_model(model_size, quantization):
+    output_dir = os.path.join(MODEL_CACHE_DIR, f"whisper-{model_size}-{quantization}")
+    if os.path.isfile(os.path.join(output_dir, "model.bin")):
+        return output_dir
+
+    converter = shutil.which("ct2-transformers-converter")
+    if not converter:
+        return model_size
+
+    try:
+        subprocess.run([
+            converter,
+            "--model", f"openai/whisper-{model_size}",
+            "--output_dir", output_dir,
+            "--quantization", quantization,
+            "--copy_files", "tokenizer.json",
+            "--force"
+        ], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        shutil.rmtree(output_dir, ignore_errors=True)
+        return model_size
+    return output_dir
+
+
 class LyricsGenerator:
-    def __init__(self, model_size="tiny.en", device="cpu", compute_type="int8"):
-        self.model = WhisperModel(model_size, device=device, compute_type=compute_type)
+    def __init__(self, model_size="tiny.en", device="cpu", compute_type="int8",
+                 cpu_threads=os.cpu_count() or 0, num_workers=1):
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.num_workers = num_workers
+        self._model = None
+
+    @property
+    def model(self):
+        # Loaded on first use so a first-run conversion doesn't block startup;
+        # faster_whisper (ctranslate2, tokenizers, av) is imported here too, so
+        # users who never open the Lyrics tab never pay for it
+        if self._model is None:
+            from faster_whisper import WhisperModel
+            self._model = WhisperModel(
+                ensure_local_model(self.model_size, self.compute_type),
+                device=self.device, compute_type=self.compute_type,
+                cpu_threads=self.cpu_threads, num_workers=self.num_workers
+            )
+        return self._model
+
+    def transcribe(self, audio_path):
+        # Greedy decoding plus VAD: isolated vocals are mostly silence
+        segments, _ = self.model.transcribe(
+            audio_path,
+            beam_size=1,
+            vad_filter=True,
+            vad_parameters={"min_silence_duration_ms": 500},
+            condition_on_previous_text=False
+        )
+        for seg in segments:
+            yield seg.text
+
+
+class TranscribeWorker(QObject):
+    segment = Signal(str)
+    done = Signal()
+
+    def __init__(self, lyrics_gen):
+        super().__init__()
+        self.lyrics_gen = lyrics_gen
 
-    def generate_lyrics(self, audio_path):
+    @Slot(str)
+    def run(self, audio_path):
+        # Segments are decoded lazily, so each one is emitted as soon as it's ready
         try:
-            segments, _ = self.model.transcribe(audio_path, beam_size=5)
-            return "\n".join(seg.text for seg in segments)
+            for text in self.lyrics_gen.transcribe(audio_path):
+                # Closing the window asks the thread to stop between segments
+                if QThread.currentThread().isInterruptionRequested():
+                    break
+                self.segment.emit(text)
         except Exception as e:
-            return f"Error: {e}"
+            self.segment.emit(f"Error: {e}")
+        self.done.emit()
 
 
 # ================= IMPORT HELPERS ================= #
-def load_audio(path):
-    data, sr = sf.read(path, dtype="float32")
-    if data.ndim > 1:
-        data = data.mean(axis=1)
-    return data, sr
+def load_audio(path, rate=SAMPLE_RATE):
+    # Decode block by block, downmixing (and resampling, if the file isn't
+    # already at `rate`) straight into the output buffer so the full-length
+    # stereo array is never allocated
+    info = sf.info(path)
+    # libsndfile doesn't scale float data read as int16, so float stems are
+    # read as float32 and scaled to int16 range here
+    is_float = info.subtype in ("FLOAT", "DOUBLE")
+    resampler = None
+    length = info.frames
+    if info.samplerate != rate:
+        resampler = soxr.ResampleStream(info.samplerate, rate, 1, dtype="float32")
+        length = int(np.ceil(info.frames * rate / info.samplerate)) + LOAD_BLOCK
+    out = np.empty(length, dtype=np.int16)
+    scratch = np.empty(LOAD_BLOCK, dtype=np.float32)
+
+    def put(chunk, i):
+        n = min(len(chunk), len(out) - i)
+        if chunk.dtype.kind == "f":
+            # Round rather than let the int16 store truncate toward zero; float
+            # sources and the resampler can both go past full scale
+            np.rint(chunk[:n], out=chunk[:n])
+            np.clip(chunk[:n], -32768, 32767, out=chunk[:n])
+        out[i:i + n] = chunk[:n]
+        return i + n
+
+    with sf.SoundFile(path) as f:
+        i = 0
+        dtype = "float32" if is_float else "int16"
+        for block in f.blocks(blocksize=LOAD_BLOCK, dtype=dtype, always_2d=True):
+            n = len(block)
+            if block.shape[1] == 1 and not resampler and not is_float:
+                i = put(block[:, 0], i)
+                continue
+            mono = scratch[:n]
+            np.mean(block, axis=1, dtype=np.float32, out=mono)
+            if is_float:
+                mono *= 32768
+            i = put(resampler.resample_chunk(mono) if resampler else mono, i)
+
+        if resampler:
+            i = put(resampler.resample_chunk(scratch[:0], last=True), i)
+
+    return out[:i], rate
 
 
 def scan_folder(folder):
     found = {}
-    files = os.listdir(folder)
+    # Lowercase each filename and build each keyword's tags only once
+    files = [(f, f.lower()) for f in os.listdir(folder)]
+    tags = [(key, f"({key})", f"(no {key})") for key in TRACK_KEYWORDS]
 
-    for key in TRACK_KEYWORDS:
+    for key, tag, neg in tags:
         matches = []
-        for f in files:
-            name = f.lower()
-            if f"(no {key})" in name:
+        for f, name in files:
+            if neg in name:
                 continue
-            if f"({key})" in name:
+            if tag in name:
                 matches.insert(0, f)
             elif key in name:
                 matches.append(f)
@@ -58,53 +280,93 @@ def scan_folder(folder):
 
 
 # ---------------- WAVEFORM ---------------- #
-class WaveformWidget(FigureCanvas):
+class WaveformWidget(QWidget):
     def __init__(self, click_callback):
-        fig = Figure(figsize=(5, 1.4), dpi=100)
-        self.ax = fig.add_subplot(111)
-        super().__init__(fig)
+        super().__init__()
+        self.setMinimumHeight(140)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
 
         self.click_callback = click_callback
         self.wave_len = 1
-        self.playhead = None
-
-        self.ax.set_facecolor("#111")
-        fig.patch.set_facecolor("#111")
-        self.mpl_connect("button_press_event", self.on_click)
+        self.lo = None
+        self.hi = None
+        self.percent = 0
+        self.playhead_x = 0
+        self._pix = QPixmap()
 
     def plot_waveform(self, audio):
-        self.ax.clear()
         step = max(1, len(audio) // 2500)
-        waveform = audio[::step]
-        self.wave_len = len(waveform)
-
-        self.ax.plot(waveform, linewidth=0.6, color="#4fc3f7")
-        self.ax.margins(x=0)
-        self.ax.set_xlim(0, self.wave_len)
+        n = len(audio) // step
+        # Min/max envelope per bin keeps peaks that stride sampling would drop
+        bins = audio[:n * step].reshape(n, step)
+        self.lo = bins.min(axis=1).astype(np.float32)
+        self.hi = bins.max(axis=1).astype(np.float32)
+        self.wave_len = max(1, n)
+
+        self.render_pixmap()
+        self.update()
+
+    def render_pixmap(self):
+        w, h = max(1, self.width()), max(1, self.height())
+        self._pix = QPixmap(w, h)
+        self._pix.fill(QColor("#111"))
+
+        if self.lo is None or not len(self.lo):
+            return
 
-        for s in self.ax.spines.values():
-            s.set_visible(False)
+        peak = float(max(abs(self.lo.min()), abs(self.hi.max()))) or 1.0
+        scale = (h / 2) / (peak * 1.05)
+        xs = np.arange(len(self.lo)) * (w / self.wave_len)
+        top = h / 2 - self.hi * scale
+        bottom = h / 2 - self.lo * scale
 
-        self.playhead = self.ax.axvline(0, color="red", linewidth=1)
-        self.ax.set_xticks([])
-        self.ax.set_yticks([])
-        self.draw_idle()
+        # Upper edge left to right, lower edge back, as one filled polygon
+        outline = QPolygonF(
+            [QPointF(x, y) for x, y in zip(xs, top)]
+            + [QPointF(x, y) for x, y in zip(xs[::-1], bottom[::-1])]
+        )
+        painter = QPainter(self._pix)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#4fc3f7"))
+        painter.drawPolygon(outline)
+        painter.end()
+
+    def resizeEvent(self, event):
+        self.render_pixmap()
+        self.playhead_x = self.column_for(self.percent)
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._pix)
+        if self.lo is not None:
+            painter.setPen(QPen(Qt.red, 1))
+            painter.drawLine(self.playhead_x, 0, self.playhead_x, self.height())
+        painter.end()
+
+    def column_for(self, percent):
+        return int((percent / 100) * (self.width() - 1))
 
     def set_playhead_percent(self, percent):
-        if self.playhead:
-            x = (percent / 100) * self.wave_len
-            self.playhead.set_xdata([x, x])
-            self.draw_idle()
-
-    def on_click(self, event):
-        if event.xdata is None:
+        self.percent = percent
+        x = self.column_for(percent)
+        if x == self.playhead_x:
             return
-        percent = max(0, min(100, (event.xdata / self.wave_len) * 100))
+        # Only repaint the columns the playhead left and entered
+        h = self.height()
+        self.update(QRect(self.playhead_x - 1, 0, 3, h))
+        self.update(QRect(x - 1, 0, 3, h))
+        self.playhead_x = x
+
+    def mousePressEvent(self, event):
+        percent = max(0, min(100, (event.position().x() / max(1, self.width())) * 100))
         self.click_callback(percent)
 
 
 # ================= MAIN APP ================= #
 class AudioMixer(QWidget):
+    lyrics_requested = Signal(str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Stem Player ^_^")
@@ -112,19 +374,46 @@ class AudioMixer(QWidget):
         self.setAcceptDrops(True)
 
         self.tracks = {}
-        self.positions = {}
+        self.track_index = {}
         self.lengths = {}
         self.sliders = {}
+        self.gain = {}
         self.waveforms = {}
-        self.mute = {}
-        self.solo = {}
-
-        self.sample_rate = 44100
+        # Bit i is set when the track at track_index i is muted / soloed
+        self.mute_mask = 0
+        self.solo_mask = 0
+        self.solo_any = False
+
+        # Stems stacked row-wise so the mix is one GEMV per block
+        self.stem_matrix = np.zeros((0, BLOCKSIZE), dtype=np.int16)
+        self.active_gains = np.zeros(0, dtype=np.float32)
+        self.total_len = 0
+        self.position = 0
+
+        self.sample_rate = SAMPLE_RATE
         self.stream = None
+        self.mixer_thread = None
+        self.mixing = False
+        self.position_lock = threading.Lock()
+
+        # Single-producer/single-consumer ring: the mixer thread only advances
+        # ring_write, the PortAudio callback only advances ring_read
+        self.ring = np.zeros(RING_BLOCKS * BLOCKSIZE, dtype=np.float32)
+        self.ring_bytes = memoryview(self.ring).cast("B")
+        self.silence = memoryview(bytes(self.ring.nbytes))
+        self.ring_read = 0
+        self.ring_write = 0
+        self.ring_space = threading.Event()
+        self.mix_kernel = mix_block
         self.is_playing = False
         self.vocals_path = None
+        self.pending_plots = []
+        self.last_px = -1
 
         self.lyrics_gen = LyricsGenerator()
+        self.lyrics_thread = QThread()
+        self.lyrics_worker = TranscribeWorker(self.lyrics_gen)
+        self.lyrics_worker.moveToThread(self.lyrics_thread)
 
         self.main_layout = QVBoxLayout(self)
 
@@ -184,6 +473,11 @@ class AudioMixer(QWidget):
         lyrics_layout.addWidget(self.lyrics_text)
         lyrics_layout.addWidget(self.btn_generate_lyrics)
 
+        self.lyrics_requested.connect(self.lyrics_worker.run)
+        self.lyrics_worker.segment.connect(self.lyrics_text.append)
+        self.lyrics_worker.done.connect(self.on_lyrics_done)
+        self.lyrics_thread.start()
+
         self.ui_timer = QTimer()
         self.ui_timer.setInterval(20)
         self.ui_timer.timeout.connect(self.update_ui)
@@ -208,31 +502,64 @@ class AudioMixer(QWidget):
             self.load_folder(folder)
 
     def load_folder(self, folder):
+        self.stop()
         self.clear_tracks_ui()
         self.tracks.clear()
-        self.positions.clear()
+        self.track_index.clear()
         self.lengths.clear()
         self.waveforms.clear()
-        self.mute.clear()
-        self.solo.clear()
+        self.gain.clear()
+        self.mute_mask = 0
+        self.solo_mask = 0
+        self.solo_any = False
 
         found = scan_folder(folder)
 
-        for name, path in found.items():
-            data, sr = load_audio(path)
-            self.tracks[name] = data
-            self.positions[name] = 0
+        # libsndfile releases the GIL, so stems decode concurrently
+        with ThreadPoolExecutor(max_workers=max(1, len(found))) as ex:
+            results = dict(zip(found, ex.map(load_audio, found.values())))
+
+        loaded = {}
+        for name, (data, _) in results.items():
+            loaded[name] = data
             self.lengths[name] = len(data)
-            self.sample_rate = sr
 
-            self.mute[name] = False   # ✅ FIX
-            self.solo[name] = False   # ✅ FIX
+        self.total_len = max(self.lengths.values(), default=0)
+        self.position = 0
+        self.last_px = -1
+
+        # One contiguous int16 slab, every row at SAMPLE_RATE, zero-padded to the
+        # longest stem plus one block so a mix block read at the end position
+        # is always full length
+        self.stem_matrix = np.zeros((len(loaded), self.total_len + BLOCKSIZE), dtype=np.int16)
+        self.active_gains = np.zeros(len(loaded), dtype=np.float32)
+        self.mix_kernel = get_mix_kernel(len(loaded))
+        # Compile (or load the cached) kernel now, not on the first audio block
+        self.mix_kernel(self.stem_matrix, self.active_gains, 0, 0, np.zeros(0, dtype=np.float32))
+
+        for i, (name, data) in enumerate(loaded.items()):
+            self.stem_matrix[i, :len(data)] = data
+            self.tracks[name] = self.stem_matrix[i, :len(data)]
+            self.track_index[name] = i
 
             if name == "vocals":
-                self.vocals_path = path
+                self.vocals_path = found[name]
 
             self.create_track_ui(name)
-            self.waveforms[name].plot_waveform(data)
+
+        self.update_active_gains()
+
+        # Plot one waveform per event-loop turn so the UI stays responsive
+        self.pending_plots = list(self.tracks)
+        QTimer.singleShot(0, self.plot_next_waveform)
+
+    def plot_next_waveform(self):
+        if not self.pending_plots:
+            return
+        name = self.pending_plots.pop(0)
+        if name in self.waveforms:
+            self.waveforms[name].plot_waveform(self.tracks[name])
+        QTimer.singleShot(0, self.plot_next_waveform)
 
     def clear_tracks_ui(self):
         while self.tracks_container.count():
@@ -247,16 +574,18 @@ class AudioMixer(QWidget):
         left = QVBoxLayout()
         btn_mute = QPushButton("M")
         btn_mute.setCheckable(True)
-        btn_mute.clicked.connect(lambda _, n=name: self.toggle_mute(n))
+        btn_mute.clicked.connect(partial(self.toggle_mute, name))
 
         btn_solo = QPushButton("S")
         btn_solo.setCheckable(True)
-        btn_solo.clicked.connect(lambda _, n=name: self.toggle_solo(n))
+        btn_solo.clicked.connect(partial(self.toggle_solo, name))
 
         slider = QSlider(Qt.Vertical)
         slider.setRange(0, 100)
         slider.setValue(80)
+        slider.valueChanged.connect(lambda v, n=name: self._set_gain(n, v / 100))
         self.sliders[name] = slider
+        self.gain[name] = slider.value() / 100
 
         left.addWidget(btn_mute)
         left.addWidget(btn_solo)
@@ -272,24 +601,53 @@ class AudioMixer(QWidget):
 
     # -------- AUDIO -------- #
     def audio_callback(self, outdata, frames, time, status):
-        mix = np.zeros(frames, dtype=np.float32)
-        solo_active = any(self.solo.values())
-
-        for name, data in self.tracks.items():
-            if self.mute[name]:
+        # Realtime thread: copy already-mixed bytes out of the ring, nothing else
+        size = len(self.ring)
+        nbytes = frames * 4
+
+        if self.ring_write - self.ring_read < frames:
+            outdata[:] = self.silence[:nbytes]
+        else:
+            start = self.ring_read % size
+            split = min(frames, size - start)
+            outdata[:split * 4] = self.ring_bytes[start * 4:(start + split) * 4]
+            if split < frames:
+                outdata[split * 4:nbytes] = self.ring_bytes[:(frames - split) * 4]
+            self.ring_read += frames
+
+        self.ring_space.set()
+
+    def mixer_loop(self):
+        size = len(self.ring)
+        while self.mixing:
+            self.ring_space.clear()
+            if self.ring_write - self.ring_read >= AHEAD_BLOCKS * BLOCKSIZE:
+                self.ring_space.wait(0.05)
                 continue
-            if solo_active and not self.solo[name]:
-                continue
-
-            pos = self.positions[name]
-            chunk = data[pos:pos + frames]
-            if len(chunk) < frames:
-                chunk = np.pad(chunk, (0, frames - len(chunk)))
 
-            mix += chunk * (self.sliders[name].value() / 100)
-            self.positions[name] += frames
-
-        outdata[:] = mix.reshape(-1, 1)
+            with self.position_lock:
+                pos = self.position
+                self.position = min(pos + BLOCKSIZE, self.total_len)
+
+            # The ring holds whole blocks, so a block never wraps
+            start = self.ring_write % size
+            self.mix_kernel(self.stem_matrix, self.active_gains, pos, BLOCKSIZE,
+                            self.ring[start:start + BLOCKSIZE])
+            self.ring_write += BLOCKSIZE
+
+    def start_mixer(self):
+        self.ring_read = 0
+        self.ring_write = 0
+        self.mixing = True
+        self.mixer_thread = threading.Thread(target=self.mixer_loop, daemon=True)
+        self.mixer_thread.start()
+
+    def stop_mixer(self):
+        self.mixing = False
+        self.ring_space.set()
+        if self.mixer_thread:
+            self.mixer_thread.join()
+            self.mixer_thread = None
 
     def play(self):
         if not self.tracks:
@@ -303,12 +661,17 @@ class AudioMixer(QWidget):
             return
 
         if not self.stream:
-            self.stream = sd.OutputStream(
+            self.stream = sd.RawOutputStream(
                 samplerate=self.sample_rate,
                 channels=1,
-                blocksize=512,
+                dtype="float32",
+                blocksize=BLOCKSIZE,
+                latency="low",
                 callback=self.audio_callback
             )
+            # Only once the stream exists, so a failed open can't leave a
+            # second producer behind on the next click
+            self.start_mixer()
 
         self.stream.start()
         self.is_playing = True
@@ -320,50 +683,72 @@ class AudioMixer(QWidget):
             self.stream.stop()
             self.stream.close()
             self.stream = None
+        self.stop_mixer()
         self.is_playing = False
         self.ui_timer.stop()
         self.btn_play.setText(PLAY_ICON)
 
     # -------- UI -------- #
     def seek_position(self, percent):
-        for name in self.tracks:
-            self.positions[name] = int((percent / 100) * self.lengths[name])
+        with self.position_lock:
+            self.position = int((percent / 100) * self.total_len)
 
-    def toggle_mute(self, name):
-        self.mute[name] = not self.mute[name]
+    def update_active_gains(self):
+        gains = np.zeros(len(self.track_index), dtype=np.float32)
+
+        for name, i in self.track_index.items():
+            bit = 1 << i
+            if self.mute_mask & bit:
+                continue
+            if self.solo_any and not self.solo_mask & bit:
+                continue
+            gains[i] = self.gain[name] * INT16_SCALE
 
-    def toggle_solo(self, name):
-        self.solo[name] = not self.solo[name]
+        # Swap in one assignment so the audio thread never sees a partial update
+        self.active_gains = gains
+
+    def _set_gain(self, name, gain):
+        self.gain[name] = gain
+        self.update_active_gains()
+
+    def toggle_mute(self, name, _checked=False):
+        self.mute_mask ^= 1 << self.track_index[name]
+        self.update_active_gains()
+
+    def toggle_solo(self, name, _checked=False):
+        self.solo_mask ^= 1 << self.track_index[name]
+        self.solo_any = bool(self.solo_mask)
+        self.update_active_gains()
 
     def update_ui(self):
         if not self.tracks:
             return
-        first = next(iter(self.tracks))
-        pos = self.positions[first]
-        length = self.lengths[first]
-        percent = (pos / length) * 100
+        percent = (self.position / self.total_len) * 100
 
         self.master_slider.blockSignals(True)
         self.master_slider.setValue(int(percent))
         self.master_slider.blockSignals(False)
 
+        # All stems share one timeline and one width, so check a single widget
+        first = next(iter(self.tracks))
+        px = self.waveforms[first].column_for(percent)
+        if px == self.last_px:
+            return
+        self.last_px = px
+
         for name in self.tracks:
             self.waveforms[name].set_playhead_percent(percent)
 
     # -------- EXPORT / LYRICS -------- #
     def export_mix(self):
-        max_len = max(self.lengths.values())
-        mix = np.zeros(max_len, dtype=np.float32)
-        solo_active = any(self.solo.values())
-
-        for name, data in self.tracks.items():
-            if self.mute[name]:
-                continue
-            if solo_active and not self.solo[name]:
-                continue
-
-            padded = np.pad(data, (0, max_len - len(data)))
-            mix += padded * (self.sliders[name].value() / 100)
+        if not self.tracks:
+            return
+        # Mix straight into the output in chunks; no full-length float copy of the stems
+        mix = np.empty(self.total_len, dtype=np.float32)
+        for start in range(0, self.total_len, EXPORT_BLOCK):
+            frames = min(EXPORT_BLOCK, self.total_len - start)
+            self.mix_kernel(self.stem_matrix, self.active_gains, start, frames,
+                            mix[start:start + frames])
 
         path, _ = QFileDialog.getSaveFileName(
             self, "Export Mix", "mix.wav", "WAV Files (*.wav)"
@@ -375,9 +760,21 @@ class AudioMixer(QWidget):
         if not self.vocals_path:
             self.lyrics_text.setText("No vocals track found")
             return
-        self.lyrics_text.setText("Generating lyrics...")
-        QApplication.processEvents()
-        self.lyrics_text.setText(self.lyrics_gen.generate_lyrics(self.vocals_path))
+        self.lyrics_text.clear()
+        self.lyrics_text.setPlaceholderText("Generating lyrics...")
+        self.btn_generate_lyrics.setEnabled(False)
+        self.lyrics_requested.emit(self.vocals_path)
+
+    def on_lyrics_done(self):
+        self.lyrics_text.setPlaceholderText("")
+        self.btn_generate_lyrics.setEnabled(True)
+
+    def closeEvent(self, event):
+        self.stop()
+        self.lyrics_thread.requestInterruption()
+        self.lyrics_thread.quit()
+        self.lyrics_thread.wait()
+        super().closeEvent(event)
 
 
 # ---------------- RUN ---------------- #